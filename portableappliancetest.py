@@ -3,7 +3,9 @@
 # Paul Sladen, 2014-11-25, Seaward SSS PAT testing file format debug harness
 # Hereby placed in the public domain in the hopes of improving
 # electrical safety and interoperability
-# Usage: ./portableappliancetest.py <input.sss>
+# Usage: ./portableappliancetest.py [--multi-sample] <input.sss>
+#        ./portableappliancetest.py [--multi-sample] --diff <old.sss> <new.sss>
+#        ./portableappliancetest.py --legacy records.txt items.txt tests.txt
 #
 # Ported to Python 3 by Angel Cascarino, 2019-02-01
 # Sections rewritten by Tom Dufall Jan-Feb 2019
@@ -61,7 +63,11 @@
 # There appears to be newer version of the format with much the same
 # structure, but with the possibility of multiple results per sub-record,
 # with the count being iuncluded as an additional byte between the
-# result code type (F0-FE) and the 16-bit result values.
+# result code type (F0-FE) and the 16-bit result values.  Nothing in
+# the stream marks this variant, so it is enabled with '--multi-sample';
+# the count follows the usual v2 fields (eg. current and pass for F2),
+# and the samples of each sub-record are decoded together into packed
+# arrays of rescaled values.
 #
 # = Further work =
 # Currently this utility is intended as a debug class to assistant
@@ -70,17 +76,18 @@
 # operating systems such as Debian and Ubuntu.
 #
 # Suggested work for those interested, could be to:
-# Add option support for newer multi-sample protocol version.
 # Add option to output ASCII is same format as meter (requires example)
 # Add option to output .csv
 
 import struct
 import sys
 import collections
-import xlsxwriter
 import datetime
 from io import BytesIO
 import logging
+import re
+import itertools
+import functools
 
 # Code is in the main() function at the bottom.  Above are helper
 # classes, and then classes for parsing the 'SSS' format itself.
@@ -92,44 +99,69 @@ class Sdb():
     below; variants of 'sdb' have been re-used over the years on various
     file-format parsers."""
     fields = []
+    # Keys added to self.data by fixup(), after the unpacked fields
+    derived_fields = []
     field_pack_format = {int: 'I'}
+    # (class, endian) -> (format_string, required_length)
+    format_strings = {}
 
     def __init__(self, endian='<'):
         self.data = collections.OrderedDict()
         self.build_format_string(endian=endian)
 
+    @classmethod
+    def from_items(cls, items):
+        """Build an instance straight from already-decoded (key, value)
+        items.  Such instances are never unpacked, so __init__ and its
+        format string lookup are skipped."""
+        self = cls.__new__(cls)
+        self.data = collections.OrderedDict(items)
+        return self
+
     def fixup(self):
         pass
 
     def build_format_string(self, endian):
         self.endian = endian
-        type_string = ''
-        for __, format_type, size in self.fields:
-            if format_type == int and size == 1:
-                type_string += 'B'
-            elif format_type == int and size == 2:
-                type_string += 'H'
-            elif format_type == int and size == 4:
-                type_string += 'L'
-            elif format_type == str:
-                type_string += str(size) + 's'
-            else:
-                type_string += self.field_pack_format[format_type]
-        self.format_string = self.endian + type_string
-        self.required_length = struct.calcsize(self.format_string)
+        # Each class/endian pair is only compiled once, on first use
+        key = (type(self), endian)
+        try:
+            self.format_string, self.required_length = Sdb.format_strings[key]
+        except KeyError:
+            type_string = ''
+            for __, format_type, size in self.fields:
+                if format_type == int and size == 1:
+                    type_string += 'B'
+                elif format_type == int and size == 2:
+                    type_string += 'H'
+                elif format_type == int and size == 4:
+                    type_string += 'L'
+                elif format_type == str:
+                    type_string += str(size) + 's'
+                else:
+                    type_string += self.field_pack_format[format_type]
+            format_string = endian + type_string
+            Sdb.format_strings[key] = (format_string, struct.calcsize(format_string))
+            self.format_string, self.required_length = Sdb.format_strings[key]
+
+    def frame(self, payload):
+        # Length of this sub-field at the start of payload
+        return len(self)
 
     def unpack(self, structure):
-        unpacked = list(struct.unpack(self.format_string, structure))
-        for name, format_type, __ in self.fields:
+        unpacked = struct.unpack(self.format_string, structure)
+        for (name, format_type, __), value in zip(self.fields, unpacked):
             if format_type == str:
-                unpacked[0] = unpacked[0].replace(b'\x00', b'').rstrip()
-                unpacked[0] = unpacked[0].decode('utf-8')
-            self.data[name] = unpacked.pop(0)
+                value = value.replace(b'\x00', b'').rstrip().decode('utf-8')
+            self.data[name] = value
         return self
 
     def headings(self):
         return [name for name, format_type, size in self.fields]
 
+    def row(self):
+        return list(self.data.values())
+
     def values(self):
         return self.data.values()
 
@@ -145,6 +177,10 @@ class Sdb():
     def __str__(self):
         return str(self.data)
 
+def rescale_value(raw):
+    # Top two bits are a negative power of ten for the lower 14 bits
+    return (10**-(raw >> 14)) * (raw & 0x3fff)
+
 # This sub-class for the SSS stream-format, most
 class SSS(Sdb):
     def __init__(self):
@@ -159,7 +195,7 @@ class SSS(Sdb):
         return self
 
     def rescale(self, key):
-        self.data[key] = (10**-(self.data[key] >> 14)) * (self.data[key] & 0x3fff)
+        self.data[key] = rescale_value(self.data[key])
 
     def passed(self, key='pass'):
         self.data[key] = bool(self.data[key] == 1)
@@ -302,12 +338,125 @@ class SSSContinuityTestv2(SSS):
         if self.data['resistance'] == 0.0:
             self.data['resistance'] = '(no result)'
 
+class SSSMultiSampleTest(SSS):
+    """Multi-sample v2 result: the usual v2 fields, then a count byte,
+    then count samples of sample_fields 16-bit values each.  All samples
+    are decoded and rescaled together into one buffer: a packed NumPy
+    array when NumPy is installed, else a list."""
+    fields = [('pass', int, 1),
+              ('count', int, 1),
+              ]
+    sample_fields = []
+    # Zero samples are shown as '(no result)', as in SSSContinuityTest
+    no_result = False
+
+    def frame(self, payload):
+        header = len(self)
+        if len(payload) < header:
+            return header
+        return header + 2 * payload[header - 1] * len(self.sample_fields)
+
+    def unpack(self, structure):
+        header = len(self)
+        super(SSS, self).unpack(structure[:header])
+        width = len(self.sample_fields)
+        if len(structure) != header + 2 * self.data['count'] * width:
+            raise SSSSyntaxError('Truncated multi-sample sub-record (%d samples)' % self.data['count'])
+        # Interleaved as read, for row(); each sample field is a column of it
+        self.buffer = unpack_samples(structure[header:], self.no_result)
+        if width == 1:
+            self.data[self.sample_fields[0]] = self.buffer
+        else:
+            for column, name in enumerate(self.sample_fields):
+                self.data[name] = self.buffer[column::width]
+        self.fixup()
+        return self
+
+    def fixup(self):
+        self.passed()
+
+    def sample_list(self, buffer):
+        # Output sinks need Python values; convert the whole buffer at
+        # once, then put '(no result)' where the NaNs are.
+        numpy = optional_numpy()
+        if numpy is not None:
+            values = buffer.tolist()
+            missing = numpy.flatnonzero(numpy.isnan(buffer)).tolist() if self.no_result else []
+        else:
+            values = list(buffer)
+            missing = [index for index, value in enumerate(values) if value != value] if self.no_result else []
+        for index in missing:
+            values[index] = '(no result)'
+        return values
+
+    def row(self):
+        row = [value for key, value in self.data.items() if key not in self.sample_fields]
+        return row + self.sample_list(self.buffer)
+
+    def items_dict(self):
+        items = ['%s:%s' % (key, value) for key, value in self.data.items() if key not in self.sample_fields]
+        items += ['%s:%s' % (name, self.sample_list(self.data[name])) for name in self.sample_fields]
+        return '{' + ', '.join(items) + '}'
+
+class SSSEarthResistanceTestv2Multi(SSSMultiSampleTest):
+    fields = [('current', int, 1),
+              ('pass', int, 1),
+              ('count', int, 1),
+              ]
+    sample_fields = ['resistance']
+
+class SSSEarthInsulationTestv2Multi(SSSMultiSampleTest):
+    sample_fields = ['resistance']
+
+class SSSCurrentTestv2Multi(SSSMultiSampleTest):
+    sample_fields = ['current']
+
+class SSSPowerLeakTestv2Multi(SSSMultiSampleTest):
+    sample_fields = ['leakage', 'load']
+
+    def fixup(self):
+        self.data['pass'] = bool(self.data['pass'])
+
+class SSSContinuityTestv2Multi(SSSMultiSampleTest):
+    sample_fields = ['resistance']
+    no_result = True
+
+@functools.lru_cache(maxsize=None)
+def optional_numpy():
+    # NumPy is optional, and only imported once multi-sample results turn up
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+def unpack_samples(structure, no_result=False):
+    # Decode and rescale all big-endian 16-bit samples in one call,
+    # returning them as one buffer in file order; with no_result, zero
+    # readings become NaN.  Only the NumPy path avoids creating a Python
+    # float for every sample; without it the samples are a plain list,
+    # which is no slower than decoding them one at a time.
+    numpy = optional_numpy()
+    if numpy is not None:
+        # rescale_value(), vectorised
+        raw = numpy.frombuffer(structure, dtype='>u2')
+        values = (raw & 0x3fff) * 10.0 ** -(raw >> 14).astype(numpy.float64)
+        if no_result:
+            values[(raw & 0x3fff) == 0] = numpy.nan
+    else:
+        raw = struct.unpack('>%dH' % (len(structure) // 2), structure)
+        values = list(map(rescale_value, raw))
+        if no_result:
+            values = [value if value else float('nan') for value in values]
+    return values
+
 class SSSUserDataMappingTest(SSS):
     fields = [('mapping1', int, 1),
               ('mapping2', int, 1),
               ('mapping3', int, 1),
               ('mapping4', int, 1),
               ]
+    derived_fields = ['meaning1', 'meaning2', 'meaning3', 'meaning4']
     mappings = {0: 'Notes',
                 1: 'Asset Description',
                 2: 'Asset Group',
@@ -375,9 +524,133 @@ TESTS_VERSION_2 = {
     0xf9: ('Lead Continuity Pass (F9)', SSSNoDataTest),
     }
 
+TESTS_VERSION_2_MULTI_SAMPLE = {
+    0xf2: ('Earth Resistance v2 multi-sample (F2)', SSSEarthResistanceTestv2Multi),
+    0xf3: ('Earth Insulation v2 multi-sample (F3)', SSSEarthInsulationTestv2Multi),
+    0xf4: ('Substitute Leakage v2 multi-sample (F4)', SSSCurrentTestv2Multi),
+    0xf5: ('Flash Leakage v2 multi-sample (F5)', SSSCurrentTestv2Multi),
+    0xf6: ('Load/Leakage v2 multi-sample (F6)', SSSPowerLeakTestv2Multi),
+    0xf7: ('Flash Leakage v2 multi-sample (F7)', SSSCurrentTestv2Multi),
+    0xf8: ('Continuity v2 multi-sample (F8)', SSSContinuityTestv2Multi),
+    }
+
 class SSSSyntaxError(SyntaxError):
     pass
 
+# Older versions of this tool wrote 'records.txt', 'items.txt' and
+# 'tests.txt' text dumps, holding the Sdb.items_dict() strings of each
+# sub-record.  The helpers below turn those back into SSS objects.
+@functools.lru_cache(maxsize=None)
+def items_dict_pattern(test_class):
+    # One compiled pattern per class, matching the declared fields and
+    # then any keys added by fixup() (eg. 'meaning1'), in order.
+    names = [name for name, __, __ in test_class.fields] + test_class.derived_fields
+    converters = [str if format_type == str else legacy_value for __, format_type, __ in test_class.fields]
+    converters += [str] * len(test_class.derived_fields)
+    # Numeric values never hold a comma, so only text needs a lazy match
+    values = ['(.*?)' if convert == str else '([^,]*)' for convert in converters]
+    keys = ', '.join(['%s:%s' % (name, value) for name, value in zip(names, values)])
+    return re.compile(keys + '$', re.DOTALL), tuple(zip(names, converters))
+
+def parse_items_dict(test_class, dictionary):
+    pattern, converters = items_dict_pattern(test_class)
+    match = pattern.match(dictionary)
+    if not match:
+        raise SSSSyntaxError('Cannot parse %s from "%s"' % (test_class.__name__, dictionary))
+    return tuple([(name, convert(value)) for (name, convert), value in zip(converters, match.groups())])
+
+# Dumps repeat the same few result strings many thousands of times, so
+# those bodies are memoised (the values are all immutable).  Free text
+# and timestamps are nearly always unique and skip the cache.
+cached_items_dict = functools.lru_cache(maxsize=4096)(parse_items_dict)
+
+LEGACY_LITERALS = {'True': True, 'False': False}
+
+def legacy_value(text):
+    # Numeric fields may have been rescaled to float, turned into a
+    # boolean by passed(), or replaced by a string such as '(no result)'.
+    if text in LEGACY_LITERALS:
+        return LEGACY_LITERALS[text]
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+@functools.lru_cache(maxsize=None)
+def legacy_test_names():
+    # The dumps name each test by its description; where a description
+    # is used twice (eg. 'Flash Leakage (F5)'), the first code wins.
+    names = {}
+    for tests in (TESTS_VERSION_1, TESTS_VERSION_2):
+        for test_type, (name, test_class) in sorted(tests.items()):
+            names.setdefault(name, (test_type, test_class))
+    return names
+
+# Fast paths for the common case of plain single-quoted strings; any
+# other line (quotes or escapes in free text) falls back to literal_eval.
+LEGACY_RECORD_LINE = re.compile(r"\[\((\d+), '\{([^'\\]*)\}'\)\]$")
+LEGACY_ITEM_LINE = re.compile(r"\['([^'\\]*)', '\{([^'\\]*)\}', '\{([^'\\]*)\}', '\{([^'\\]*)\}'\]$")
+LEGACY_TEST_LINE = re.compile(r"\((\d+), '([^'\\]*)', '\{([^'\\]*)\}'\)$")
+
+def legacy_lines(legacy_file):
+    # The dumps were written on Windows with '\r\r\n' line endings,
+    # which read back as a blank line after every entry
+    return filter(None, map(str.rstrip, legacy_file))
+
+def legacy_literal(line):
+    # Only lines missed by the fast paths need ast, so import it here
+    import ast
+    try:
+        return ast.literal_eval(line)
+    except (ValueError, SyntaxError):
+        raise SSSSyntaxError('Cannot parse legacy line "%s"' % line)
+
+def legacy_fields(line, pattern):
+    match = pattern.match(line)
+    if match:
+        return match.groups()
+    literal = legacy_literal(line)
+    # records.txt wraps its tuple in a single-element list
+    if isinstance(literal, list) and len(literal) == 1:
+        literal = literal[0]
+    return tuple(value[1:-1] if isinstance(value, str) and value[:1] == '{' and value[-1:] == '}' else value
+                 for value in literal)
+
+def parse_legacy_record(line):
+    record_id, visual = legacy_fields(line, LEGACY_RECORD_LINE)
+    # Visual pass/fail is not kept in records.txt; both codes report alike
+    return int(record_id), (0x01, SSSVisualTest.from_items(parse_items_dict(SSSVisualTest, visual)))
+
+def parse_legacy_item(line):
+    __, retest, mapping, user_data = legacy_fields(line, LEGACY_ITEM_LINE)
+    # The mapping (E0) must be reported before the user data (FB) it sorts
+    return [(0xe1, SSSRetestTest.from_items(cached_items_dict(SSSRetestTest, retest))),
+            (0xe0, SSSUserDataMappingTest.from_items(cached_items_dict(SSSUserDataMappingTest, mapping))),
+            (0xfb, SSSUserDataTest.from_items(parse_items_dict(SSSUserDataTest, user_data)))]
+
+# Only the record id varies between most lines of tests.txt, so the
+# rest of each line is parsed once and memoised
+@functools.lru_cache(maxsize=4096)
+def legacy_test(rest):
+    __, name, body = legacy_fields('(0, ' + rest, LEGACY_TEST_LINE)
+    try:
+        test_type, test_class = legacy_test_names()[name]
+    except KeyError:
+        raise SSSSyntaxError('Unknown legacy test "%s"' % name)
+    return test_type, test_class, parse_items_dict(test_class, body)
+
+def parse_legacy_test(line):
+    record_id, __, rest = line.partition(', ')
+    test_type, test_class, items = legacy_test(rest)
+    try:
+        return int(record_id[1:]), test_type, test_class.from_items(items)
+    except ValueError:
+        raise SSSSyntaxError('Cannot parse legacy line "%s"' % line)
+
 def static_vars(**kwargs):
     def decorate(func):
         for k in kwargs:
@@ -385,7 +658,7 @@ def static_vars(**kwargs):
         return func
     return decorate
 
-def parse_sss(filehandle, output_workbook):
+def parse_sss(filehandle, output_workbook, multi_sample=False):
     records = records_gen(filehandle, SSSRecordHeader())
     record_header = SSSRecordHeader()
     record = None
@@ -397,7 +670,7 @@ def parse_sss(filehandle, output_workbook):
             # file parsing complete
             break
 
-        parse_record(payload, record_id, output_workbook)
+        parse_record(payload, record_id, output_workbook, multi_sample)
         record_id += 1
 
 def records_gen(filehandle, record_header):
@@ -417,8 +690,7 @@ def records_gen(filehandle, record_header):
             continue
         yield payload
 
-@static_vars(test_id=1)
-def parse_record(payload, record_id, output_workbook):
+def subrecords_gen(payload, multi_sample=False):
     tests = TESTS_VERSION_1.copy()
     version = 1
 
@@ -431,15 +703,24 @@ def parse_record(payload, record_id, output_workbook):
         if version == 1 and test_type in (0x11, 0x12):
             version += 1
             tests.update(TESTS_VERSION_2)
-        current_test = tests[test_type][1]()
+            if multi_sample:
+                tests.update(TESTS_VERSION_2_MULTI_SAMPLE)
+        name, test_class = tests[test_type]
+        current_test = test_class()
         # Unpack the current sub-field
-        current_test.unpack(payload[:len(current_test)])
+        length = current_test.frame(payload)
+        current_test.unpack(payload[:length])
 
-        tests_written = report_record(record_id, current_test, test_type, parse_record.test_id, output_workbook)
-        parse_record.test_id += tests_written
+        yield test_type, name, current_test
 
         # Seek past to start of next sub-field
-        payload = payload[len(current_test):]
+        payload = payload[length:]
+
+@static_vars(test_id=1)
+def parse_record(payload, record_id, output_workbook, multi_sample=False):
+    for test_type, __, current_test in subrecords_gen(payload, multi_sample):
+        tests_written = report_record(record_id, current_test, test_type, parse_record.test_id, output_workbook)
+        parse_record.test_id += tests_written
 
 @static_vars(user_notes=(0, 1, 2, 3), user_counts=[0, 0, 0, 0, 0, 0])
 def report_record(record_id, current_test, test_type, test_id, output_workbook):
@@ -456,7 +737,7 @@ def report_record(record_id, current_test, test_type, test_id, output_workbook):
 
     tests_written = 0
 
-    data_values = list(current_test.data.values())
+    data_values = current_test.row()
 
     if test_type in (0x01, 0x02, 0x11, 0x12, 0xfe, 0xe0, 0xe1):
         #These all modify the 'record' sheet
@@ -504,7 +785,126 @@ def report_record(record_id, current_test, test_type, test_id, output_workbook):
 
     return tests_written
 
+def legacy_records_gen(records_file, items_file, tests_file):
+    # records.txt and items.txt are line-aligned, while tests.txt holds
+    # the tests of each record in record order; all three are streamed.
+    tests = map(parse_legacy_test, legacy_lines(tests_file))
+    test_record_id, test_type, current_test = next(tests, (None, None, None))
+    for record_line, item_line in itertools.zip_longest(legacy_lines(records_file), legacy_lines(items_file)):
+        if record_line is None or item_line is None:
+            raise SSSSyntaxError('records.txt and items.txt have different numbers of entries')
+        record_id, visual = parse_legacy_record(record_line)
+        subrecords = [visual] + parse_legacy_item(item_line)
+        while test_record_id is not None and test_record_id <= record_id:
+            if test_record_id < record_id:
+                logging.warning('Tests found for unknown record %d', test_record_id)
+            else:
+                subrecords.append((test_type, current_test))
+            test_record_id, test_type, current_test = next(tests, (None, None, None))
+        # The dumps count records from zero, parse_sss() from one
+        yield record_id + 1, subrecords
+    if test_record_id is not None:
+        logging.warning('Tests found after the last record (%d)', test_record_id)
+
+def parse_legacy(records_file, items_file, tests_file, output_workbook):
+    test_id = 1
+    for record_id, subrecords in legacy_records_gen(records_file, items_file, tests_file):
+        for test_type, current_test in subrecords:
+            test_id += report_record(record_id, current_test, test_type, test_id, output_workbook)
+
+def record_asset_id(payload):
+    # The asset id is the first field of the visual test that opens each
+    # record; slice it out rather than decoding the whole record
+    if payload[0] not in (0x01, 0x02, 0x11, 0x12):
+        return ''
+    length = SSSVisualTest.fields[0][2]
+    return payload[1:1 + length].replace(b'\x00', b'').rstrip().decode('utf-8', 'replace')
+
+def fingerprint_records(filehandle):
+    # Imported here, like xlsxwriter, so only --diff runs pay for it
+    import hashlib
+    # records_gen() leaves the file just past each payload it yields
+    for payload in records_gen(filehandle, SSSRecordHeader()):
+        offset = filehandle.tell() - len(payload)
+        yield record_asset_id(payload), hashlib.blake2b(payload, digest_size=16).digest(), offset, len(payload)
+
+def take_digest(digests, asset_id, digest):
+    # Remove one matching fingerprint, if the asset has one left
+    counter = digests.get(asset_id)
+    if not counter or digest not in counter:
+        return False
+    counter[digest] -= 1
+    if not counter[digest]:
+        del counter[digest]
+    return True
+
+def read_payload(filehandle, offset, length):
+    filehandle.seek(offset)
+    return filehandle.read(length)
+
+def diff_sss(old_file, new_file):
+    """Compare two dumps by asset id, yielding ('added', 'removed' or
+    'changed', asset_id, old_payload, new_payload) for each difference.
+    Only fingerprints of the old dump and file offsets of unmatched
+    records are held in memory; payloads are re-read as they are
+    reported, so both files must be seekable."""
+    # An asset is usually tested many times, so each id maps to a
+    # multiset of the fingerprints of all its records
+    old_digests = collections.defaultdict(collections.Counter)
+    for asset_id, digest, __, __ in fingerprint_records(old_file):
+        old_digests[asset_id][digest] += 1
+
+    new_offsets = collections.defaultdict(list)
+    for asset_id, digest, offset, length in fingerprint_records(new_file):
+        if not take_digest(old_digests, asset_id, digest):
+            new_offsets[asset_id].append((offset, length))
+
+    # Second pass to find the old records left without a match
+    old_offsets = collections.defaultdict(list)
+    if any(old_digests.values()):
+        old_file.seek(0)
+        for asset_id, digest, offset, length in fingerprint_records(old_file):
+            if take_digest(old_digests, asset_id, digest):
+                old_offsets[asset_id].append((offset, length))
+
+    for asset_id in sorted(set(old_offsets) | set(new_offsets)):
+        old = [read_payload(old_file, *position) for position in old_offsets[asset_id]]
+        new = [read_payload(new_file, *position) for position in new_offsets[asset_id]]
+        for old_payload, new_payload in zip(old, new):
+            yield 'changed', asset_id, old_payload, new_payload
+        for old_payload in old[len(new):]:
+            yield 'removed', asset_id, old_payload, None
+        for new_payload in new[len(old):]:
+            yield 'added', asset_id, None, new_payload
+
+def subrecord_lines(payload, multi_sample=False):
+    if payload is None:
+        return []
+    return ['%s %s' % (name, current_test.items_dict())
+            for __, name, current_test in subrecords_gen(payload, multi_sample)]
+
+def print_unmatched(marker, lines, unmatched):
+    # Print the unmatched lines in their original order
+    for line in lines:
+        if unmatched[line] > 0:
+            unmatched[line] -= 1
+            print('  %s %s' % (marker, line))
+
+def print_diff(changes, multi_sample=False):
+    counts = collections.Counter()
+    for change, asset_id, old_payload, new_payload in changes:
+        counts[change] += 1
+        print('%s %s' % (change, asset_id))
+        old_lines = subrecord_lines(old_payload, multi_sample)
+        new_lines = subrecord_lines(new_payload, multi_sample)
+        # Compare as multisets, so repeated readings are counted
+        print_unmatched('-', old_lines, collections.Counter(old_lines) - collections.Counter(new_lines))
+        print_unmatched('+', new_lines, collections.Counter(new_lines) - collections.Counter(old_lines))
+    print('%d added, %d removed, %d changed' % (counts['added'], counts['removed'], counts['changed']))
+
 def initialise_output(filename):
+    # Imported here so that only runs producing a workbook pay for it
+    import xlsxwriter
     output_workbook = xlsxwriter.Workbook(filename + '_output.xlsx', {'default_date_format': 'yyyy-mm-ddThh:mm'})
 
     record_sheet = output_workbook.add_worksheet("Records")
@@ -533,28 +933,85 @@ def initialise_output(filename):
 
     return output_workbook
 
+def usage():
+    print("usage: %s [--multi-sample] input.sss [input2.sss ...]" % sys.argv[0], file=sys.stderr)
+    print("       %s [--multi-sample] --diff old.sss new.sss" % sys.argv[0], file=sys.stderr)
+    print("       %s --legacy records.txt items.txt tests.txt" % sys.argv[0], file=sys.stderr)
+    sys.exit(2)
+
 def main():
     # set level of logging that gets displayed - debug<info<warning<error<critical
     logging.basicConfig(level=logging.INFO)
 
-    if len(sys.argv) < 2:
-        print("usage: %s [input.sss]" % sys.argv[0], file=sys.stderr)
-        sys.exit(2)
+    # Flags may appear anywhere on the command-line; the rest are filenames
+    flags = set()
+    filenames = []
+    for argument in sys.argv[1:]:
+        if argument in ('--multi-sample', '--diff', '--legacy'):
+            flags.add(argument)
+        elif argument.startswith('--'):
+            print('unknown option "%s"' % argument, file=sys.stderr)
+            usage()
+        else:
+            filenames.append(argument)
+    multi_sample = '--multi-sample' in flags
+
+    if not filenames:
+        usage()
+
+    if '--legacy' in flags:
+        # The text dumps predate the multi-sample format, and are not .sss
+        if flags != {'--legacy'}:
+            print('--legacy cannot be combined with other options', file=sys.stderr)
+            usage()
+        main_legacy(filenames)
+        return
+
+    if '--diff' in flags:
+        main_diff(filenames, multi_sample)
+        return
 
     # Simplify testing/dumping by allowing multiple input files on the command-line
-    for filename in sys.argv[1:]:
+    for filename in filenames:
         print('trying "%s"' % filename)
         with open(filename, 'rb') as file:
             contents = file.read()
             wrapped = BytesIO(contents)
             output_workbook = initialise_output(filename)
             try:
-                parse_sss(wrapped, output_workbook)
+                parse_sss(wrapped, output_workbook, multi_sample)
                 output_workbook.close()
             except (SSSSyntaxError) as message:
                 print('End File {Error:"%s"}' % message)
                 output_workbook.close()
                 continue
 
+def main_legacy(filenames):
+    # Re-import the records/items/tests text dumps of older versions
+    if len(filenames) != 3:
+        usage()
+    records_filename, items_filename, tests_filename = filenames
+    print('trying "%s"' % records_filename)
+    output_workbook = initialise_output(records_filename)
+    with open(records_filename, encoding='utf-8') as records_file, \
+            open(items_filename, encoding='utf-8') as items_file, \
+            open(tests_filename, encoding='utf-8') as tests_file:
+        try:
+            parse_legacy(records_file, items_file, tests_file, output_workbook)
+        except (SSSSyntaxError) as message:
+            print('End File {Error:"%s"}' % message)
+    output_workbook.close()
+
+def main_diff(filenames, multi_sample=False):
+    # Report the records added, removed or changed between two dumps
+    if len(filenames) != 2:
+        usage()
+    old_filename, new_filename = filenames
+    with open(old_filename, 'rb') as old_file, open(new_filename, 'rb') as new_file:
+        try:
+            print_diff(diff_sss(old_file, new_file), multi_sample)
+        except (SSSSyntaxError) as message:
+            print('End File {Error:"%s"}' % message)
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Builds synthetic .sss dumps, so tests don't need real tester downloads.
+
+import struct
+
+def visual(asset_id, test_type=0x11):
+    # v2 visual test, which opens each record and carries its asset id
+    return bytes([test_type]) + struct.pack('>16sBBBBH16s16s11s10s11s', asset_id, 13, 26, 8, 9, 2012,
+                                            b'UoB', b'SHED', b'TESTER', b'I0A0000011', b'S121111111')
+
+def scaled(value, exponent):
+    # Inverse of rescale_value(): value * 10**-exponent
+    return (exponent << 14) | value
+
+def samples(*raw):
+    return struct.pack('>%dH' % len(raw), *raw)
+
+def record(payload):
+    # Record header: length, unused, then the 16-bit checksum of the payload
+    return struct.pack('>HHH', len(payload), 0, sum(payload) & 0xffff) + payload
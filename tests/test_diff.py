@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# --diff: comparing two .sss dumps record by record
+
+import struct
+
+import portableappliancetest as pat
+from sss_builder import record, scaled, visual
+
+class SeekCountingFile(pat.BytesIO):
+    # Counts rewinds, to tell whether diff_sss() re-read the old dump
+    rewinds = 0
+
+    def seek(self, offset, *args):
+        if offset == 0 and not args:
+            self.rewinds += 1
+        return super(SeekCountingFile, self).seek(offset, *args)
+
+def earth_record(asset_id, resistance, repeats=1):
+    earth = bytes([0xf2, 2, 1]) + struct.pack('>H', scaled(resistance, 2))
+    return record(visual(asset_id) + earth * repeats + bytes([0xff]))
+
+def diff(old_records, new_records):
+    old_file = SeekCountingFile(b''.join(old_records))
+    new_file = SeekCountingFile(b''.join(new_records))
+    changes = [(change, asset_id) for change, asset_id, __, __ in pat.diff_sss(old_file, new_file)]
+    return changes, old_file.rewinds
+
+def test_identical_dumps():
+    records = [earth_record(b'A', 5), earth_record(b'A', 5), earth_record(b'B', 6)]
+    changes, rewinds = diff(records, records)
+    assert changes == []
+    # Every record matched on the first pass over the old dump
+    assert rewinds == 0
+
+def test_repeated_identical_records_are_counted():
+    # A record repeated once more in the old dump has been removed
+    changes, __ = diff([earth_record(b'A', 5)] * 3, [earth_record(b'A', 5)] * 2)
+    assert changes == [('removed', 'A')]
+
+def test_changed_added_and_removed():
+    old = [earth_record(b'A', 5), earth_record(b'B', 6), earth_record(b'C', 7)]
+    new = [earth_record(b'A', 5), earth_record(b'B', 9), earth_record(b'D', 8)]
+    changes, rewinds = diff(old, new)
+    assert changes == [('changed', 'B'), ('removed', 'C'), ('added', 'D')]
+    # Unmatched old records are found on a second pass
+    assert rewinds == 1
+
+def test_changed_payloads_are_reread():
+    old_file = pat.BytesIO(earth_record(b'A', 5))
+    new_file = pat.BytesIO(earth_record(b'A', 9))
+    [(change, asset_id, old_payload, new_payload)] = pat.diff_sss(old_file, new_file)
+    assert change == 'changed'
+    assert old_payload == earth_record(b'A', 5)[6:]
+    assert new_payload == earth_record(b'A', 9)[6:]
+
+def test_print_diff_counts_repeated_sub_records(capsys):
+    # Seven readings against six: only one line is reported as removed
+    old_file = pat.BytesIO(earth_record(b'A', 5, repeats=7))
+    new_file = pat.BytesIO(earth_record(b'A', 5, repeats=6))
+    pat.print_diff(pat.diff_sss(old_file, new_file))
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == 'changed A'
+    assert [line[:3] for line in lines[1:-1]] == ['  -']
+    assert lines[-1] == '0 added, 0 removed, 1 changed'
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# Import-time benchmark for portableappliancetest.py.  The CLI is called
+# thousands of times from scripts, so output backends such as xlsxwriter
+# must only be loaded once a workbook is actually written.
+
+import os
+import subprocess
+import sys
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULE = 'portableappliancetest'
+
+# Generous enough for a loaded CI machine; importing xlsxwriter alone
+# costs more than this on the machines it was measured on.
+IMPORT_BUDGET_MS = 60
+RUNS = 5
+
+def import_module():
+    # Fresh interpreter per run, returning (cumulative import ms, modules)
+    code = 'import sys, %s; print(" ".join(sorted(sys.modules)))' % MODULE
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=REPOSITORY, capture_output=True, text=True, check=True)
+    # -X importtime lines look like 'import time: self | cumulative | name'
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == MODULE:
+            return int(fields[1]) / 1000.0, result.stdout.split()
+    raise AssertionError('%s missing from -X importtime output' % MODULE)
+
+def test_output_backends_are_deferred():
+    __, modules = import_module()
+    assert 'xlsxwriter' not in modules
+    assert 'hashlib' not in modules
+
+def test_import_time_within_budget():
+    # Best of several runs, to keep scheduling noise out of the figure
+    best = min(import_module()[0] for __ in range(RUNS))
+    print('%s imports in %.1f ms (budget %d ms)' % (MODULE, best, IMPORT_BUDGET_MS))
+    assert best < IMPORT_BUDGET_MS
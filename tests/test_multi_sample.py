@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Multi-sample v2 sub-records, as decoded with --multi-sample
+
+import math
+
+import pytest
+
+import portableappliancetest as pat
+from sss_builder import record, samples, scaled, visual
+
+def decode(*subrecords):
+    # Returns {name: test} for the sub-records of a single record
+    payload = visual(b'000573') + b''.join(subrecords) + bytes([0xff])
+    header = pat.SSSRecordHeader()
+    [payload] = pat.records_gen(pat.BytesIO(record(payload)), header)
+    return {name: test for __, name, test in pat.subrecords_gen(payload, multi_sample=True)}
+
+def test_earth_resistance_keeps_v2_prefix():
+    # current and pass come before the count byte
+    raw = [scaled(5, 1), scaled(2221, 2), scaled(6, 0)]
+    tests = decode(bytes([0xf2, 2, 1, len(raw)]) + samples(*raw))
+    test = tests['Earth Resistance v2 multi-sample (F2)']
+    assert test.data['current'] == 2
+    assert test.data['pass'] is True
+    assert test.data['count'] == 3
+    assert test.row() == [2, True, 3, 0.5, 22.21, 6]
+
+def test_load_leakage_splits_sample_pairs():
+    raw = [scaled(1, 2), scaled(6, 0), scaled(2, 2), scaled(7, 0)]
+    tests = decode(bytes([0xf6, 1, 2]) + samples(*raw))
+    test = tests['Load/Leakage v2 multi-sample (F6)']
+    assert list(test.data['leakage']) == [0.01, 0.02]
+    assert list(test.data['load']) == [6, 7]
+    # Rows keep the samples interleaved, as they were read
+    assert test.row() == [True, 2, 0.01, 6, 0.02, 7]
+
+def test_continuity_zero_is_no_result():
+    raw = [scaled(73, 2), 0, scaled(74, 2)]
+    tests = decode(bytes([0xf8, 1, len(raw)]) + samples(*raw))
+    test = tests['Continuity v2 multi-sample (F8)']
+    assert math.isnan(test.data['resistance'][1])
+    assert test.row() == [True, 3, 0.73, '(no result)', 0.74]
+    assert test.items_dict() == "{pass:True, count:3, resistance:[0.73, '(no result)', 0.74]}"
+
+def test_no_samples():
+    tests = decode(bytes([0xf3, 1, 0]), bytes([0xf9]))
+    test = tests['Earth Insulation v2 multi-sample (F3)']
+    assert test.row() == [True, 0]
+    # The next sub-record is still found
+    assert 'Lead Continuity Pass (F9)' in tests
+
+def test_truncated_samples():
+    with pytest.raises(pat.SSSSyntaxError):
+        decode(bytes([0xf2, 2, 1, 3]) + samples(scaled(5, 1)))